@@ -1,3 +1,3 @@
 """Package for collecting pytest tests."""
 
-from .collector import collect
+from .collector import Collector, collect
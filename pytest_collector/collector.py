@@ -1,12 +1,38 @@
 """Package for collecting pytest tests."""
 
-import inspect
-import pytest
+import copy
+import functools
+import os
+import re
+import sys
+import time
 
+# NOTE: `pytest` (and `inspect`) are only imported when actually collecting,
+#       so importing this package doesn't pay for importing pytest.
 
+# How long (in seconds) the collected tests of a path are reused by `collect`.
+COLLECT_CACHE_TTL = 5
+# The last collection of each tests path, as (collection time, collected modules).
+_COLLECT_CACHE = {}
+
+
+@functools.lru_cache(maxsize=32)
+def _leading_whitespace_pattern(max_length: int):
+    """
+    Get a (compiled) pattern matching up to `max_length` white spaces at the start of each line.
+
+    :param max_length: The maximal amount of white spaces to match.
+    :return: The compiled pattern.
+    """
+
+    return re.compile(rf'^[^\S\n]{{1,{max_length}}}', re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=1024)
 def reindent(string: str) -> str:
     """
     reindent a given code-like string and fix the indentation to have no leading spaces.
+    The results are cached, as the same docstrings tend to repeat (e.g. parametrized tests).
 
     :param string: The string to indent.
     :return: The indented string.
@@ -18,18 +44,41 @@ def reindent(string: str) -> str:
     # First remove any leading and trailing line drops...
     string = string.strip('\n')
 
+    # If the first line has no leading spaces there's nothing to strip (the common docstring case).
+    if not string.startswith(' '):
+        return string
+
     # Calculate the leading spaces for the first line of the string.
     # ignore '\t' as it isn't common to indent with (and will mess the logic here).
     leading_spaces = len(string) - len(string.lstrip(' '))
-    lines = []
-    for line in string.splitlines():
-        # We use lstrip to remove white spaces at the start of each line,
-        # If we will let lstrip work on the whole line it might remove too much...
-        # (lets say a double indent for a `for` loop in a function...)
-        # So it's only allowed to strip `leading_spaces` at maximum.
-        lines.append(line[:leading_spaces].lstrip() + line[leading_spaces:])
 
-    return "\n".join(lines)
+    # Remove white spaces at the start of each line in a single pass over the whole string,
+    # If we will let it remove all of them it might remove too much...
+    # (lets say a double indent for a `for` loop in a function...)
+    # So it's only allowed to strip `leading_spaces` at maximum.
+    # NOTE: `textwrap.dedent` is not used here, it strips the *common* indentation
+    #       and empties white-space-only lines, which changes the output of docstrings
+    #       like `test_4`'s (and it scans the string more than once to do so).
+    return _leading_whitespace_pattern(leading_spaces).sub('', string)
+
+
+class _Node:  # pylint: disable=too-few-public-methods
+    """A node of the collected modules->suites->tests tree."""
+
+    __slots__ = ("name", "obj", "children")
+
+    def __init__(self, name: str, obj, children: dict = None):
+        """
+        Create a new tree node.
+
+        :param name: The name of the node.
+        :param obj: The pytest item/collector of the node.
+        :param children: The children nodes by their names (None for tests, which are leaves).
+        """
+
+        self.name = name
+        self.obj = obj
+        self.children = children
 
 
 class CollectorPlugin:
@@ -41,6 +90,9 @@ class CollectorPlugin:
         """
 
         self._modules = None
+        # The (reindented) sources of the collected functions, by their code's file and first line.
+        # Parametrized tests share the same function, so its source is only read once.
+        self._sources = {}
 
     @property
     def modules(self) -> list:
@@ -62,93 +114,344 @@ class CollectorPlugin:
         """
 
         # First we need to create the tests modules->suites->tests tree.
+        # Keep track of the children of every node already in the tree (starting with the session,
+        # whose children are the modules), so sibling tests don't walk up the same levels again.
         modules = {}
+        known_children = {session: modules}
         for test in session.items:
-            # For each test, traverse up the tree all the way to the root (modules),
-            # keeping track of the hierarchy.
-            test_module = self.get_test_module_tree(test)
-            if test_module["name"] not in modules:
-                # If the module is new to us, just save it as a new module.
-                modules[test_module["name"]] = test_module
-            else:
-                # If the current module is already known,
-                # we need to merge the new (single) child into the existing module.
-                self.merge_child_to_parent(modules[test_module["name"]],
-                                           list(test_module["children"].values())[0])
+            self.insert_test(known_children, test)
 
         # Now that we have the tree figured out, we create a list of modules data.
-        self._modules = [self.collect_data(module) for module in modules.values()]
+        self._modules = [self.collect_tree(module) for module in modules.values()]
 
     @staticmethod
-    def get_test_module_tree(test) -> dict:
+    def insert_test(known_children: dict, test) -> None:
         """
-        Traverses up the tests hierarchy tree to the modules (root), keeping track of the way up.
+        Inserts the test into the modules->suites->tests tree, creating any missing levels in place.
 
-        :param test: The test (leaf) to traverse up from.
-        :return: The hierarchy from the module (root) to the test (leaf).
+        :param known_children: The children of each node already in the tree, by the node.
+                               Must contain the session (root), and is updated with new nodes.
+        :param test: The test (leaf) to insert.
+        :return: Nothing.
         """
 
+        # Traverse up the tests hierarchy tree until a known level, keeping track of the way up.
+        chain = []
         level = test.parent
-        hierarchy = {"name": test.name, "obj": test}
-        while level.parent is not None:
-            hierarchy = {
-                "name": level.name,
-                "obj": level,
-                "children": {hierarchy["name"]: hierarchy}
-            }
+        while level not in known_children:
+            chain.append(level)
             level = level.parent
 
-        return hierarchy
+        # Descend the tree from the known level down to the test's parent, adding the new levels.
+        children = known_children[level]
+        for level in reversed(chain):
+            entry = children.get(level.name)
+            if entry is None:
+                entry = _Node(level.name, level, {})
+                children[level.name] = entry
+            children = entry.children
+            known_children[level] = children
 
-    def merge_child_to_parent(self, parent: dict, child: dict) -> None:
-        """
-        Merge the child into the parent children list.
-        if the child already there, recursively makesure the grandchildren are there too.
+        children[test.name] = _Node(test.name, test)
 
-        :param parent: The parent to add a child to.
-        :param child: The child to add.
-        :return: Nothing.
+    def collect_tree(self, root: _Node) -> dict:
         """
-
-        # If the child is new, just add it.
-        if child["name"] not in parent["children"]:
-            parent["children"][child["name"]] = child
-        # If the child is known(not new), go over the grandchildren of the child and add them too.
-        elif "children" in child:
-            for grandchild in child["children"].values():
-                self.merge_child_to_parent(parent["children"][child["name"]], grandchild)
-
-    def collect_data(self, item: dict) -> dict:
-        """
-        Collects the following data about the given item:
+        Collects the following data about each item in the tree of the given root:
          * type(str) - one of `Module`, `Class`, `Function`.
          * title(str) - the title of the item.
          * doc(str) - the documentation string of the item.
          * src(str) - the source code of the item (for functions only).
          * children(list) - list of children data objects (for non-functions only).
 
-        The children list is collected via recursive call to this function.
+        The tree is walked iteratively: first all the items are discovered in pre-order,
+        then their data is built in reverse order so each item's children are ready before it.
+
+        :param root: The root item of the tree to collect data about.
+        :return: The data of the given root item.
+        """
+
+        import pytest  # pylint: disable=import-outside-toplevel
+
+        # Discover all the items of the tree (parents always come before their children).
+        stack = [root]
+        order = []
+        while stack:
+            item = stack.pop()
+            order.append(item)
+            if item.children is not None:
+                stack.extend(item.children.values())
+
+        # Build the data bottom-up, keeping track of each item's data by its id.
+        items_data = {}
+        for item in reversed(order):
+            # Get the simple data.
+            item_obj = item.obj
+            item_type = type(item_obj).__name__
+            item_data = {
+                "type": item_type,
+                "title": item_obj.name,
+                "doc": reindent(item_obj.obj.__doc__),
+            }
+
+            # If function get the sources code, if not then gather the children's data.
+            if isinstance(item_obj, pytest.Function):
+                item_data["src"] = self.get_source(item_obj.obj)
+            else:
+                item_data["children"] = [items_data[id(child)]
+                                         for child in item.children.values()]
+
+            items_data[id(item)] = item_data
+
+        return items_data[id(root)]
+
+    def get_source(self, function) -> str:
+        """
+        Get the (reindented) source code of the given function, reading it only once per function.
+
+        :param function: The function to get the source code of.
+        :return: The source code of the function.
+        """
+
+        import inspect  # pylint: disable=import-outside-toplevel
+
+        # Key by where the code of the unwrapped function is, as that's what `inspect.getsource`
+        # reads (decorated functions may share the same wrapper code). The code objects themselves
+        # can't be the key, as equal code objects from different files compare equal.
+        code = inspect.unwrap(function).__code__
+        key = (code.co_filename, code.co_firstlineno)
+        source = self._sources.get(key)
+        if source is None:
+            source = reindent(inspect.getsource(function))
+            self._sources[key] = source
+
+        return source
+
+
+class Collector:
+    """
+    Collects the pytest tests at a path, reusing a single pytest configuration for all the
+    collections of it.
+
+    Preparing the configuration (loading the plugins and conftest files, parsing the options)
+    is most of the work of a small collection, so a long-lived collector only pays for it once.
+    """
+
+    def __init__(self, tests_dir_path: str):
+        """
+        Create a new collector, preparing and configuring pytest for the given path.
+
+        :param tests_dir_path: The path for the tests
+                               (it's used by pytest to determine the rootdir and the ini file).
+        """
+
+        # pylint: disable=import-outside-toplevel
+        import pytest
+        from _pytest.config import ConftestImportFailure, _prepareconfig
+
+        # The cache provider isn't needed for only collecting, so don't load it.
+        try:
+            self._config = _prepareconfig(["--collect-only", "-qq", "-p", "no:cacheprovider",
+                                           tests_dir_path])
+        except (pytest.UsageError, ConftestImportFailure) as error:
+            # Like `pytest.main`, failing to prepare the configuration is a usage error.
+            raise ValueError(pytest.ExitCode.USAGE_ERROR) from error
+
+        try:
+            self._config._do_configure()  # pylint: disable=protected-access
+        except BaseException as error:  # pylint: disable=broad-except
+            ret = self._error_exit_code(error, started=False)
+            self.close()
+            raise ValueError(ret) from error
+
+    def __enter__(self) -> "Collector":
+        """
+        Use the collector as a context manager, closing it at exit.
 
-        :param item: The item to collect data about.
-        :return: The data of the given item.
+        :return: The collector.
         """
 
-        # Get the simple data.
-        item_obj = item["obj"]
-        item_data = {
-            "type": type(item_obj).__name__,
-            "title": item_obj.name,
-            "doc": reindent(item_obj.obj.__doc__),
-        }
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Close the collector.
+
+        :param exc_info: The exception raised in the context (if any).
+        :return: Nothing.
+        """
+
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unconfigure pytest, the collector can't be used afterwards.
+
+        :return: Nothing.
+        """
+
+        self._config._ensure_unconfigure()  # pylint: disable=protected-access
+
+    def collect(self) -> list:
+        """
+        Collects the test via pytest at the collector's path.
+
+        NOTE: The pytest tests at the path will be imported
+              by the current process and the fixture will be setup.
+              This is so that if there's a repeated test for each of a fixture's outputs,
+              that test will be collected as repeated.
+
+        NOTE: Test modules that were already imported are not reloaded,
+              so only new test modules are picked up by repeated collections
+              (changes to already collected modules are not).
+
+        :return: The collected tests.
+        """
+
+        # Create our collector plugin and use pytest with it, only for this collection.
+        collector_plugin = CollectorPlugin()
+        self._config.pluginmanager.register(collector_plugin)
+        try:
+            self._collect_session()
+        finally:
+            self._config.pluginmanager.unregister(collector_plugin)
+
+        # Return the collected test modules.
+        return collector_plugin.modules
+
+    def _collect_session(self) -> None:
+        """
+        Run only the collection part of a pytest session (instead of `pytest.main`),
+        there are no tests to run so the rest of the main loop is skipped.
 
-        # If function get the sources code, if not then collect the children's data.
-        if type(item_obj).__name__ == "Function":
-            item_data["src"] = reindent(inspect.getsource(item_obj.obj))
+        :return: Nothing.
+        :raises ValueError: With the exit code of the session, if the collection didn't succeed.
+        """
+
+        import pytest  # pylint: disable=import-outside-toplevel
+        from _pytest.main import Session  # pylint: disable=import-outside-toplevel
+
+        config = self._config
+        # Forget the files collected by previous sessions, so they aren't skipped as duplicates,
+        # and don't let the reports of previous sessions show up in this one's summary.
+        config.pluginmanager._duplicatepaths.clear()  # pylint: disable=protected-access
+        terminal_reporter = config.pluginmanager.get_plugin("terminalreporter")
+        if terminal_reporter is not None:
+            terminal_reporter.stats.clear()
+
+        session = Session.from_config(config)
+        session.exitstatus = pytest.ExitCode.OK
+        started = False
+        error = None
+        try:
+            try:
+                config.hook.pytest_sessionstart(session=session)
+                started = True
+                config.hook.pytest_collection(session=session)
+                # Like `pytest.main`, collection errors interrupt the session
+                # (unless asked to continue, which fails it instead).
+                if session.testsfailed and not config.option.continue_on_collection_errors:
+                    raise session.Interrupted(f"{session.testsfailed} error(s) during collection")
+                session.exitstatus = self._session_exit_code(session)
+            except BaseException as session_error:  # pylint: disable=broad-except
+                error = session_error
+                session.exitstatus = self._error_exit_code(session_error, started)
+
+            os.chdir(session.startpath)
+            if started:
+                try:
+                    config.hook.pytest_sessionfinish(session=session,
+                                                     exitstatus=session.exitstatus)
+                except pytest.exit.Exception as exit_error:
+                    if exit_error.returncode is not None:
+                        session.exitstatus = exit_error.returncode
+                    sys.stderr.write(f"{type(exit_error).__name__}: {exit_error}\n")
+        finally:
+            # The session (and its fixture manager) register themselves as plugins,
+            # remove them so the next session can register its own.
+            for name in ("session", "funcmanage"):
+                plugin = config.pluginmanager.get_plugin(name)
+                if plugin is not None:
+                    config.pluginmanager.unregister(plugin)
+
+        # Make sure pytest succeeded.
+        if session.exitstatus != pytest.ExitCode.OK:
+            raise ValueError(session.exitstatus) from error
+
+    def _error_exit_code(self, error: BaseException, started: bool) -> int:
+        """
+        Get the exit code (`pytest.ExitCode`) of an error raised while configuring or collecting,
+        reporting it to the plugins like `pytest.main` does.
+        Must be called while handling the error.
+
+        :param error: The error raised by pytest.
+        :param started: Whether the session started (before the error was raised).
+        :return: The exit code of the error.
+        """
+
+        # pylint: disable=import-outside-toplevel
+        import pytest
+        from _pytest.main import Session
+
+        if isinstance(error, pytest.UsageError):
+            return pytest.ExitCode.USAGE_ERROR
+        if isinstance(error, Session.Failed):
+            return pytest.ExitCode.TESTS_FAILED
+
+        config = self._config
+        excinfo = pytest.ExceptionInfo.from_current()
+        if isinstance(error, (KeyboardInterrupt, pytest.exit.Exception)):
+            ret = pytest.ExitCode.INTERRUPTED
+            if isinstance(error, pytest.exit.Exception):
+                if error.returncode is not None:
+                    ret = error.returncode
+                if not started:
+                    sys.stderr.write(f"{excinfo.typename}: {error.msg}\n")
+            config.hook.pytest_keyboard_interrupt(excinfo=excinfo)
         else:
-            item_data["children"] = [self.collect_data(child)
-                                     for child in item["children"].values()]
+            # Any other error is an internal error of pytest (or of its plugins).
+            ret = pytest.ExitCode.INTERNAL_ERROR
+            try:
+                config.notify_exception(excinfo, config.option)
+            except pytest.exit.Exception as exit_error:
+                if exit_error.returncode is not None:
+                    ret = exit_error.returncode
+                sys.stderr.write(f"{type(exit_error).__name__}: {exit_error}\n")
+
+        # Reporting the error stops pytest's output capturing, restart it for the next collections.
+        self._restart_capturing()
+        return ret
+
+    def _restart_capturing(self) -> None:
+        """
+        Restart pytest's (global) output capturing, it's stopped when errors are reported
+        but the next collections of this collector need it too.
+
+        :return: Nothing.
+        """
+
+        capture_manager = self._config.pluginmanager.get_plugin("capturemanager")
+        # pylint: disable-next=protected-access
+        if capture_manager is not None and capture_manager._global_capturing is None:
+            capture_manager.start_global_capturing()
+            capture_manager.suspend_global_capture()
 
-        return item_data
+    @staticmethod
+    def _session_exit_code(session) -> int:
+        """
+        Get the exit code (`pytest.ExitCode`) of a session that finished collecting (uninterrupted).
+
+        :param session: The pytest session data object.
+        :return: The exit code of the session.
+        """
+
+        import pytest  # pylint: disable=import-outside-toplevel
+
+        if session.testsfailed:
+            return pytest.ExitCode.TESTS_FAILED
+        if session.testscollected == 0:
+            return pytest.ExitCode.NO_TESTS_COLLECTED
+
+        return pytest.ExitCode.OK
 
 
 def collect(tests_dir_path: str) -> list:
@@ -160,18 +463,27 @@ def collect(tests_dir_path: str) -> list:
           This is so that if there's a repeated test for each of a fixture's outputs,
           that test will be collected as repeated.
 
+    NOTE: Repeated collections of the same path within `COLLECT_CACHE_TTL` seconds
+          return a copy of the previously collected tests instead of collecting again.
+
+    NOTE: pytest is configured for this collection only (and unconfigured afterwards),
+          use a `Collector` to reuse the configuration for repeated collections.
+
     :param tests_dir_path: The path for the tests.
     :return: The collected tests.
     """
 
-    # Create our collector plugin and use pytest with it.
-    collector_plugin = CollectorPlugin()
-    ret = pytest.main(["--collect-only", "-qq", tests_dir_path], [collector_plugin])
-    # ret = pytest.main(["--setup-plan", "-qq", tests_dir], [collector_plugin])
-
-    # Make sure pytest succeeded.
-    if ret != pytest.ExitCode.OK:
-        raise ValueError(ret)
-
-    # Return the collected test modules.
-    return collector_plugin.modules
+    # Reuse the last collection of this path if it's recent enough.
+    cache_key = os.path.abspath(tests_dir_path)
+    cached = _COLLECT_CACHE.get(cache_key)
+    if cached is not None:
+        if time.monotonic() - cached[0] < COLLECT_CACHE_TTL:
+            # Return a copy, so callers changing the result won't change the cached tests.
+            return copy.deepcopy(cached[1])
+        # The collection is stale, forget it.
+        del _COLLECT_CACHE[cache_key]
+
+    with Collector(cache_key) as collector:
+        modules = collector.collect()
+    _COLLECT_CACHE[cache_key] = (time.monotonic(), copy.deepcopy(modules))
+    return modules
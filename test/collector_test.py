@@ -0,0 +1,161 @@
+"""Tests for collecting with a (reused) collector."""
+
+import pytest
+
+import pytest_collector
+
+
+def test_collect_twice() -> None:
+    """
+    Collect the example suites twice with the same collector.
+
+    :return: Nothing
+    """
+
+    expected = pytest_collector.collect("./example_suites")
+    with pytest_collector.Collector("./example_suites") as collector:
+        assert collector.collect() == expected
+        assert collector.collect() == expected
+
+
+def test_collect_added_module(tmp_path) -> None:
+    """
+    Collect a module added after the first collection.
+
+    :param tmp_path: Temporary directory for the tests.
+    :return: Nothing
+    """
+
+    (tmp_path / "first_added_test.py").write_text("def test_first() -> None:\n    pass\n")
+    with pytest_collector.Collector(str(tmp_path)) as collector:
+        assert [module["title"] for module in collector.collect()] == ["first_added_test.py"]
+
+        (tmp_path / "second_added_test.py").write_text("def test_second() -> None:\n    pass\n")
+        assert [module["title"] for module in collector.collect()] == ["first_added_test.py",
+                                                                       "second_added_test.py"]
+
+
+def test_collect_error(tmp_path) -> None:
+    """
+    Collect a module that fails to import.
+
+    :param tmp_path: Temporary directory for the tests.
+    :return: Nothing
+    """
+
+    (tmp_path / "broken_test.py").write_text("import pytest_collector_missing_package\n")
+    with pytest.raises(ValueError):
+        pytest_collector.collect(str(tmp_path))
+
+    with pytest_collector.Collector(str(tmp_path)) as collector:
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                collector.collect()
+
+
+def test_collect_same_functions(tmp_path) -> None:
+    """
+    Collect the sources of identical functions (same name, line and code) in different modules.
+
+    :param tmp_path: Temporary directory for the tests.
+    :return: Nothing
+    """
+
+    sources = {
+        "slow_same_test.py": "@pytest.mark.slow\ndef test_same():\n    assert True  # checks A",
+        "fast_same_test.py": "@pytest.mark.fast\ndef test_same():\n    assert True  # checks B",
+    }
+    for name, source in sources.items():
+        (tmp_path / name).write_text(f"import pytest\n\n\n{source}\n")
+
+    for module in pytest_collector.collect(str(tmp_path)):
+        assert module["children"][0]["src"] == sources[module["title"]]
+
+
+def test_collect_cached(tmp_path, monkeypatch) -> None:
+    """
+    Collect the same path twice within `COLLECT_CACHE_TTL`, the first collection is reused.
+
+    :param tmp_path: Temporary directory for the tests.
+    :param monkeypatch: Fixture for patching the cache TTL.
+    :return: Nothing
+    """
+
+    monkeypatch.setattr(pytest_collector.collector, "COLLECT_CACHE_TTL", 60)
+    (tmp_path / "cached_test.py").write_text("def test_cached() -> None:\n    pass\n")
+    first = pytest_collector.collect(str(tmp_path))
+
+    # The new module isn't collected, as the cached collection is returned.
+    (tmp_path / "uncached_test.py").write_text("def test_uncached() -> None:\n    pass\n")
+    assert pytest_collector.collect(str(tmp_path)) == first
+
+    # Changing a returned result doesn't change the cached collection.
+    expected = pytest_collector.collect(str(tmp_path))
+    first[0]["children"].clear()
+    first.clear()
+    assert pytest_collector.collect(str(tmp_path)) == expected
+
+
+def test_collect_not_cached(tmp_path, monkeypatch) -> None:
+    """
+    Collect the same path twice with no `COLLECT_CACHE_TTL`, the path is collected again.
+
+    :param tmp_path: Temporary directory for the tests.
+    :param monkeypatch: Fixture for patching the cache TTL.
+    :return: Nothing
+    """
+
+    monkeypatch.setattr(pytest_collector.collector, "COLLECT_CACHE_TTL", 0)
+    (tmp_path / "fresh_test.py").write_text("def test_fresh() -> None:\n    pass\n")
+    assert [module["title"] for module in pytest_collector.collect(str(tmp_path))] == \
+        ["fresh_test.py"]
+
+    (tmp_path / "fresher_test.py").write_text("def test_fresher() -> None:\n    pass\n")
+    assert [module["title"] for module in pytest_collector.collect(str(tmp_path))] == \
+        ["fresh_test.py", "fresher_test.py"]
+
+
+@pytest.mark.parametrize("files, exit_code", [
+    ({}, pytest.ExitCode.NO_TESTS_COLLECTED),
+    ({"missing_test.py": "import pytest_collector_missing_package\n"},
+     pytest.ExitCode.INTERRUPTED),
+    ({"missing_test.py": "import pytest_collector_missing_package\n",
+      "pytest.ini": "[pytest]\naddopts = --continue-on-collection-errors\n"},
+     pytest.ExitCode.TESTS_FAILED),
+    ({"exit_test.py": "import pytest\n\npytest.exit('bye')\n"},
+     pytest.ExitCode.INTERRUPTED),
+    ({"conftest.py": "import pytest\n\npytest.exit('bye')\n"},
+     pytest.ExitCode.USAGE_ERROR),
+    ({"conftest.py": "def pytest_collection_modifyitems():\n    raise RuntimeError('boom')\n",
+      "passing_test.py": "def test_passing() -> None:\n    pass\n"},
+     pytest.ExitCode.INTERNAL_ERROR),
+])
+def test_collect_exit_code(tmp_path, files: dict, exit_code: pytest.ExitCode) -> None:
+    """
+    Collect tests that fail to collect, with the same exit code `pytest.main` has.
+
+    :param tmp_path: Temporary directory for the tests.
+    :param files: The files (by their names) of the tests directory.
+    :param exit_code: The expected exit code.
+    :return: Nothing
+    """
+
+    for name, content in files.items():
+        (tmp_path / name).write_text(content)
+
+    with pytest.raises(ValueError) as error:
+        pytest_collector.collect(str(tmp_path))
+    assert error.value.args == (exit_code,)
+
+
+def test_collect_missing_path(tmp_path) -> None:
+    """
+    Collect a path that doesn't exist.
+
+    :param tmp_path: Temporary directory for the tests.
+    :return: Nothing
+    """
+
+    with pytest.raises(ValueError) as error:
+        pytest_collector.collect(str(tmp_path / "missing"))
+    assert error.value.args == (pytest.ExitCode.USAGE_ERROR,)
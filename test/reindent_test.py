@@ -0,0 +1,58 @@
+"""Tests for reindenting docs and sources."""
+
+from pytest_collector.collector import reindent
+
+
+def test_reindent_docstring() -> None:
+    """
+    Reindent an indented docstring.
+
+    :return: Nothing
+    """
+
+    assert reindent("\n    Second test case.\n\n    :return: Nothing.\n    ") == \
+        "Second test case.\n\n:return: Nothing.\n"
+
+
+def test_reindent_nested() -> None:
+    """
+    Reindent a source with nested indentation, keeping the inner indentation.
+
+    :return: Nothing
+    """
+
+    assert reindent("    def test():\n        for m in n:\n            print(n)\n") == \
+        "def test():\n    for m in n:\n        print(n)"
+
+
+def test_reindent_tabs() -> None:
+    """
+    Reindent a source with a tab-indented body, tabs count as a single white space.
+
+    :return: Nothing
+    """
+
+    assert reindent("    def test():\n\tpass\n\t\t    pass") == "def test():\npass\n  pass"
+
+
+def test_reindent_first_line() -> None:
+    """
+    Reindent a docstring whose text starts on the first line (`test_4` style).
+
+    :return: Nothing
+    """
+
+    assert reindent(" This is a long line\nWrapped\n\n        :return: Nothing.\n        ") == \
+        "This is a long line\nWrapped\n\n       :return: Nothing.\n       "
+
+
+def test_reindent_unindented() -> None:
+    """
+    Reindent strings that have nothing to reindent.
+
+    :return: Nothing
+    """
+
+    assert reindent(None) is None
+    assert reindent("") == ""
+    assert reindent("First test case") == "First test case"